@@ -7,16 +7,72 @@ Global Beverage Copropration Exchange All Share Index)
 can be calculated and displayed.
 """
 
-from datetime import datetime, timedelta
+from array import array
+from bisect import bisect_left
 import math
+import time
+from types import MappingProxyType
+
+# Trading indicator codes, as stored for each trade
+BUY, SELL = 0, 1
+
+# Names of the trading indicators, indexed by code, and the lookups derived from them
+_INDICATOR_NAMES = ("buy", "sell")
+_INDICATOR_CODES = {name: code for code, name in enumerate(_INDICATOR_NAMES)}
+_VALID_INDICATORS = frozenset(_INDICATOR_CODES)
+
+# Dividend per share used by the dividend yield, by stock type
+_YIELD_DIVIDENDS = {
+    'Common': lambda stock: stock.lastDividend, # Common stock: lastDividend
+    'Preferred': lambda stock: stock.fixedDividend * stock.parValue, # Preferred stock: fixedDividend * parValue
+}
+
+# Window of trades used for the Volume Weighted Stock Price: 5 minutes, in nanoseconds
+_VWSP_WINDOW_NS = 5 * 60 * 1_000_000_000
+
+def _indicator_code(indicator):
+    """
+    Convert a trading indicator to its code.
+
+    Args:
+        indicator (str or int): Indicator of the trade ('buy' or 'sell' in any case, or BUY or SELL).
+
+    Returns:
+        int: BUY or SELL.
+
+    Raises:
+        ValueError: If the indicator is not 'buy' or 'sell'.
+    """
+    # Codes are passed through, names are looked up, only lowercasing them when they aren't already lowercase
+    if isinstance(indicator, str):
+        code = _INDICATOR_CODES.get(indicator)
+        if code is None:
+            code = _INDICATOR_CODES.get(indicator.lower())
+    elif type(indicator) is int and indicator in (BUY, SELL):
+        code = indicator
+    else:
+        code = None
+
+    if code is None:
+        raise ValueError("Indicator must be 'buy' or 'sell'")
+    return code
 
 class StockMarket:
     """
     StockMarket class to manage multiple stocks and their trades.
+
+    Notes:
+        The market caches each stock's VWSP for the GBCE All Share Index, so stocks
+        must be added with add_stock: self.stocks is a read-only view of them by symbol.
+        A stock belongs to at most one market.
     """
     def __init__(self):
-        # Initialize an empty dictionary to store stock by their symbol
-        self.stocks = {}
+        # Initialize an empty dictionary to store stock by their symbol, exposed read-only
+        self._stocks = {}
+        self.stocks = MappingProxyType(self._stocks)
+        self._logVwsps = {} # log(VWSP) of each stock with a non-zero VWSP, by symbol
+        self._allShareIndex = 0 # Cached GBCE All Share Index, None when a VWSP has changed since
+        self._nextExpiry = math.inf # Earliest time, from time.monotonic_ns(), at which any stock's trades can expire
 
     def add_stock(self, stock):
         """
@@ -24,9 +80,24 @@ class StockMarket:
 
         Args:
             stock (Stock): Stock object to be added to the market.
+
+        Raises:
+            ValueError: If the stock already belongs to another market.
         """
-        # Add stock to the market
-        self.stocks[stock.symbol] = stock
+        # A stock can only report its VWSP changes to one market
+        if stock._market is not None and stock._market is not self:
+            raise ValueError("Stock already belongs to another market")
+
+        # Detach any stock being replaced under the same symbol
+        replacedStock = self._stocks.get(stock.symbol)
+        if replacedStock is not None:
+            replacedStock._market = None
+
+        # Add stock to the market and start tracking its VWSP
+        self._stocks[stock.symbol] = stock
+        stock._market = self
+        self._on_vwsp_change(stock.symbol, stock._vwsp)
+        self._nextExpiry = min(self._nextExpiry, stock._nextExpiry)
 
     def record_trade(self, symbol, quantity, indicator, price):
         """
@@ -35,19 +106,41 @@ class StockMarket:
         Args:
             symbol (str): Symbol of the stock for which trade is being recorded.
             quantity (float): Quantity of shares traded.
-            indicator (str): Indicator of the trade ('buy' or 'sell').
+            indicator (str or int): Indicator of the trade ('buy' or 'sell', or BUY or SELL).
             price (float): Price per share of the trade.
 
         Raises:
             ValueError: If the indicator is not 'buy' or 'sell', or if the stock symbol is not found in the market.
         """
-        # Validate indicator
-        if indicator.lower() not in ["buy", "sell"]:
-            raise ValueError("Indicator must be 'buy' or 'sell'")
+        # Validate indicator, once, before the stock stores it
+        indicatorCode = _indicator_code(indicator)
         
         # Record a trade for a specific stock identified by its symbol
         if symbol in self.stocks:
-            self.stocks[symbol].record_trade(quantity, indicator, price)
+            self.stocks[symbol]._append_trade(quantity, indicatorCode, price)
+        else:
+            raise ValueError("Stock symbol not found in market")
+
+    def record_trades(self, symbol, quantities, indicators, prices):
+        """
+        Record a batch of trades for a specific stock identified by its symbol.
+
+        Args:
+            symbol (str): Symbol of the stock for which trades are being recorded.
+            quantities (iterable of float): Quantity of shares traded in each trade.
+            indicators (iterable of str or int): Indicator of each trade ('buy' or 'sell', or BUY or SELL).
+            prices (iterable of float): Price per share of each trade.
+
+        Raises:
+            ValueError: If an indicator is not 'buy' or 'sell', if the batches differ in length,
+                or if the stock symbol is not found in the market.
+        """
+        # Validate indicators, as record_trade does, before looking up the stock
+        indicatorCodes = array('B', map(_indicator_code, indicators))
+
+        # Record the trades for a specific stock identified by its symbol
+        if symbol in self.stocks:
+            self.stocks[symbol]._append_trades(quantities, indicatorCodes, prices)
         else:
             raise ValueError("Stock symbol not found in market")
         
@@ -61,21 +154,59 @@ class StockMarket:
         Notes:
             Returns 0 if there are no trades in any stock.
         """
-        # Calculate the GBCE All Share Index using the geometric mean of VWSP for all stocks
-        volumeWeightedPrices = [stock.calculate_volume_weighted_stock_price() for stock in self.stocks.values()]
-        nonZeroPrices = [price for price in volumeWeightedPrices if price > 0]
+        # Expire old trades so every stock's VWSP, and with it the cached logs, is current.
+        # Until the earliest expiry time is reached no stock has anything to expire, so skip the checks.
+        if time.monotonic_ns() > self._nextExpiry:
+            nextExpiry = math.inf
+            for stock in self.stocks.values():
+                stock._expire_trades()
+                nextExpiry = min(nextExpiry, stock._nextExpiry)
+            self._nextExpiry = nextExpiry
+
+        if self._allShareIndex is None:
+            if not self._logVwsps:
+                self._allShareIndex = 0 # No trades in any stock
+            else:
+                # Geometric mean of the VWSPs, averaging logs so large prices don't overflow.
+                # fsum adds the logs exactly, so the result doesn't depend on the order of updates.
+                self._allShareIndex = math.exp(math.fsum(self._logVwsps.values()) / len(self._logVwsps))
 
-        if not nonZeroPrices:
-            return 0 # No trades in any stock
-        
-        # Geometric mean formula: nth root of the product of prices
-        productOfPrices = math.prod(nonZeroPrices)
-        return productOfPrices ** (1/len(nonZeroPrices))
+        return self._allShareIndex
+
+    def _on_trade_recorded(self, timestamp):
+        """
+        Bring the earliest expiry time forward for a trade recorded in one of the market's stocks.
+
+        Args:
+            timestamp (int): Time of the trade, from time.monotonic_ns().
+        """
+        # Only changes the earliest expiry time when the trade is the oldest in its stock
+        self._nextExpiry = min(self._nextExpiry, timestamp + _VWSP_WINDOW_NS)
+
+    def _on_vwsp_change(self, symbol, vwsp):
+        """
+        Update the cached log of a stock's VWSP when it changes.
+
+        Args:
+            symbol (str): Symbol of the stock whose VWSP changed.
+            vwsp (float): New VWSP of the stock.
+        """
+        # Only stocks with a positive VWSP contribute to the GBCE All Share Index
+        if vwsp > 0:
+            self._logVwsps[symbol] = math.log(vwsp)
+        else:
+            self._logVwsps.pop(symbol, None)
+
+        self._allShareIndex = None # Recalculate on the next request
     
 class Stock:
     """
     Stock class representing a single stock in the market.
     """
+    __slots__ = ('symbol', 'type', 'lastDividend', 'fixedDividend', 'parValue',
+                 '_timestamps', '_quantities', '_prices', '_indicators', '_start',
+                 '_totalQuantity', '_totalTradePriceQuantity', '_vwsp', '_nextExpiry', '_market')
+
     def __init__(self, symbol, type, lastDividend, fixedDividend, parValue):
         # Initialise the stock with given attributes
         self.symbol = symbol # Stock symbol, e.g. 'POP'
@@ -83,7 +214,49 @@ class Stock:
         self.lastDividend = lastDividend # Last dividend value
         self.fixedDividend = fixedDividend # Fixed dividend for Preferred GIN stock
         self.parValue = parValue # Par value of the stock
-        self.trades = [] # List to record all trades for this stock 
+
+        # Trades are stored column-wise, oldest first, from index self._start onwards
+        self._timestamps = array('q') # Time of each trade, from time.monotonic_ns()
+        self._quantities = array('d') # Number of shares traded
+        self._prices = array('d') # Trade price per share
+        self._indicators = array('B') # BUY or SELL
+        self._start = 0 # Index of the oldest trade still in the 5 minute window
+        self._totalQuantity = 0.0 # Running sum of quantity over the window
+        self._totalTradePriceQuantity = 0.0 # Running sum of price * quantity over the window
+        self._vwsp = 0 # VWSP as of the last trade or expiry
+        self._nextExpiry = math.inf # Time, from time.monotonic_ns(), at which the oldest trade in the window expires
+        self._market = None # StockMarket notified when the VWSP changes
+
+    @property
+    def trades(self):
+        """
+        Trades recorded for this stock in the past 5 minutes.
+
+        Returns:
+            list of Trade: Trades, oldest first.
+
+        Notes:
+            Builds a new list on each access; use count_trades() for just the number of trades.
+        """
+        # Expire old trades, then build Trade objects from the stored columns on demand
+        self._expire_trades()
+        start = self._start
+        return [
+            Trade(timestamp, quantity, _INDICATOR_NAMES[indicator], price)
+            for timestamp, quantity, indicator, price in zip(
+                self._timestamps[start:], self._quantities[start:], self._indicators[start:], self._prices[start:])
+        ]
+
+    def count_trades(self):
+        """
+        Count the trades recorded for this stock in the past 5 minutes.
+
+        Returns:
+            int: Number of trades.
+        """
+        # Expire old trades, then count what's left in the columns
+        self._expire_trades()
+        return len(self._timestamps) - self._start
 
     def calculate_dividend_yield(self, price):
         """
@@ -102,14 +275,13 @@ class Stock:
         if price <= 0:
             raise ValueError("Price must be greater than zero.")
         
-        if self.type == 'Common':
-            # Dividend Yield for Common stock: lastDividend / price
-            return self.lastDividend / price
-        elif self.type == 'Preferred':
-            # Dividend Yield for Preferred stock: (fixedDividend * parValue) / price
-            return (self.fixedDividend * self.parValue) / price
-        else:
+        # Look up the dividend per share for the stock type, from the stock's current attributes
+        yieldDividend = _YIELD_DIVIDENDS.get(self.type)
+        if yieldDividend is None:
             raise ValueError('Unknown stock type.')
+
+        # Dividend Yield: lastDividend / price for Common stock, (fixedDividend * parValue) / price for Preferred
+        return yieldDividend(self) / price
         
     def calculate_pe_ratio(self, price):
         """
@@ -135,12 +307,101 @@ class Stock:
 
         Args:
             quantity (float): Number of shares traded.
-            indicator (str): Indicator of the trade ('buy' or 'sell').
+            indicator (str or int): Indicator of the trade ('buy' or 'sell', or BUY or SELL).
+            price (float): Price per share of the trade.
+
+        Raises:
+            ValueError: If the indicator is not 'buy' or 'sell'.
+        """
+        # Validate the indicator, then record the trade with its code
+        self._append_trade(quantity, _indicator_code(indicator), price)
+
+    def _append_trade(self, quantity, indicatorCode, price):
+        """
+        Record a trade whose indicator has already been converted to its code.
+
+        Args:
+            quantity (float): Number of shares traded.
+            indicatorCode (int): BUY or SELL.
             price (float): Price per share of the trade.
         """
+        # Convert every value before storing any of it, so a bad value can't leave the columns out of step
+        quantity = float(quantity)
+        price = float(price)
+
         # Record a trade with the given details
-        trade = Trade(datetime.now(), quantity, indicator, price)
-        self.trades.append(trade)
+        timestamp = time.monotonic_ns()
+        self._timestamps.append(timestamp)
+        self._quantities.append(quantity)
+        self._prices.append(price)
+        self._indicators.append(indicatorCode)
+
+        # Keep the running sums used by the VWSP in step with the trades
+        self._totalQuantity += quantity
+        self._totalTradePriceQuantity += price * quantity
+        self._nextExpiry = min(self._nextExpiry, timestamp + _VWSP_WINDOW_NS)
+        self._update_vwsp()
+
+        if self._market is not None:
+            self._market._on_trade_recorded(timestamp)
+
+    def record_trades(self, quantities, indicators, prices):
+        """
+        Record a batch of trades with the given details, all at the current time.
+
+        Args:
+            quantities (iterable of float): Number of shares traded in each trade.
+            indicators (iterable of str or int): Indicator of each trade ('buy' or 'sell', or BUY or SELL).
+            prices (iterable of float): Price per share of each trade.
+
+        Raises:
+            ValueError: If an indicator is not 'buy' or 'sell', or if the batches differ in length.
+        """
+        # Validate the indicators, then record the trades with their codes
+        self._append_trades(quantities, array('B', map(_indicator_code, indicators)), prices)
+
+    def _append_trades(self, quantities, indicatorCodes, prices):
+        """
+        Record a batch of trades whose indicators have already been converted to their codes.
+
+        Args:
+            quantities (iterable of float): Number of shares traded in each trade.
+            indicatorCodes (array of int): BUY or SELL for each trade.
+            prices (iterable of float): Price per share of each trade.
+
+        Raises:
+            ValueError: If the batches differ in length.
+        """
+        # Convert and validate the whole batch before storing any of it
+        quantities = array('d', quantities)
+        prices = array('d', prices)
+        if not len(quantities) == len(indicatorCodes) == len(prices):
+            raise ValueError("Quantities, indicators and prices must have the same length")
+        if not quantities:
+            return # Nothing to record
+
+        # Work out the running sums and timestamps before storing anything, so nothing can fail part way.
+        # Trades are added one at a time, exactly as record_trade would add them.
+        totalQuantity = self._totalQuantity
+        totalTradePriceQuantity = self._totalTradePriceQuantity
+        for quantity, price in zip(quantities, prices):
+            totalQuantity += quantity
+            totalTradePriceQuantity += price * quantity
+        timestamp = time.monotonic_ns()
+        timestamps = array('q', [timestamp]) * len(quantities)
+
+        # Append the batch to each column in one go
+        self._timestamps.extend(timestamps)
+        self._quantities.extend(quantities)
+        self._prices.extend(prices)
+        self._indicators.extend(indicatorCodes)
+        self._totalQuantity = totalQuantity
+        self._totalTradePriceQuantity = totalTradePriceQuantity
+        self._nextExpiry = min(self._nextExpiry, timestamp + _VWSP_WINDOW_NS)
+        self._update_vwsp()
+
+        if self._market is not None:
+            self._market._on_trade_recorded(timestamp)
 
     def calculate_volume_weighted_stock_price(self):
         """
@@ -151,29 +412,116 @@ class Stock:
 
         Notes:
             Returns 0 if no trades occurred in the past 5 minutes.
+            Trades older than 5 minutes are discarded.
         """
-        # Calculate the Volume Weighted Stock Price based on trades in the past 5 minutes
-        now = datetime.now()
+        # Expire old trades, which keeps the cached VWSP up to date
+        self._expire_trades()
+        return self._vwsp
 
-        # Filter trades that occured in the last 5 minutes
-        pastTrades = [trade for trade in self.trades if now - trade.timestamp <= timedelta(minutes=5)]
-
-        totalQuantity = sum(trade.quantity for trade in pastTrades)
-        if totalQuantity == 0:
-            return 0 # No trades in the past 5 minutes
+    def _expire_trades(self):
+        """
+        Discard trades older than 5 minutes and update the VWSP if any were discarded.
+        """
+        now = time.monotonic_ns()
+        if now <= self._nextExpiry:
+            return # No trade has left the window yet, so the cached VWSP still holds
+        cutoff = now - _VWSP_WINDOW_NS
+
+        # Timestamps are in recording order, so expired trades form a prefix of the columns
+        start = self._start
+        end = bisect_left(self._timestamps, cutoff, start)
+        if end > start:
+            # Back the expired trades out of the running sums, visiting only the expired trades
+            quantities = self._quantities
+            prices = self._prices
+            expiredQuantity = 0.0
+            expiredTradePriceQuantity = 0.0
+            for i in range(start, end):
+                quantity = quantities[i]
+                expiredQuantity += quantity
+                expiredTradePriceQuantity += prices[i] * quantity
+            self._totalQuantity -= expiredQuantity
+            self._totalTradePriceQuantity -= expiredTradePriceQuantity
+            self._start = end
+
+            if end > len(self._timestamps) // 2:
+                # Reclaim storage once most of it is expired, and re-sum what's left to clear any
+                # rounding error, which costs no more than visiting the trades just dropped
+                self._clear_expired_trades()
+                self._sum_window()
+            elif (abs(expiredQuantity) > abs(self._totalQuantity)
+                  or abs(expiredTradePriceQuantity) > abs(self._totalTradePriceQuantity)):
+                # More was backed out than is left, so cancellation may have wiped out the
+                # remaining trades' contribution: re-sum them
+                self._sum_window()
+
+            self._update_vwsp()
+
+        self._nextExpiry = self._expiry_time()
+
+    def _expiry_time(self):
+        """
+        Time at which the oldest trade still in the window expires.
 
-        totalTradePriceQuantity = sum(trade.price * trade.quantity for trade in pastTrades)
+        Returns:
+            int or float: Expiry time from time.monotonic_ns(), or math.inf if there are no trades in the window.
+        """
+        # Trades expire once they are more than 5 minutes old
+        if self._start == len(self._timestamps):
+            return math.inf
+        return self._timestamps[self._start] + _VWSP_WINDOW_NS
 
+    def _update_vwsp(self):
+        """
+        Recalculate the cached VWSP from the running sums and notify the market of any change.
+        """
         # VWSP Formula: sum(price * quantity) / sum(quantity)
-        return totalTradePriceQuantity / totalQuantity
+        oldVwsp = self._vwsp
+        if self._totalQuantity == 0:
+            self._vwsp = 0 # No quantity traded in the past 5 minutes
+        else:
+            self._vwsp = self._totalTradePriceQuantity / self._totalQuantity
+
+        if self._market is not None and self._vwsp != oldVwsp:
+            self._market._on_vwsp_change(self.symbol, self._vwsp)
+
+    def _sum_window(self):
+        """
+        Recalculate the running sums directly from the trades in the window.
+        """
+        # Sum quantity and price * quantity over the trades from self._start onwards, in one pass
+        quantities = self._quantities
+        prices = self._prices
+        totalQuantity = 0.0
+        totalTradePriceQuantity = 0.0
+        for i in range(self._start, len(quantities)):
+            quantity = quantities[i]
+            totalQuantity += quantity
+            totalTradePriceQuantity += prices[i] * quantity
+        self._totalQuantity = totalQuantity
+        self._totalTradePriceQuantity = totalTradePriceQuantity
+
+    def _clear_expired_trades(self):
+        """
+        Drop the expired trades before self._start from the stored columns.
+        """
+        # Delete the expired prefix from every column and start again from index 0
+        start = self._start
+        del self._timestamps[:start]
+        del self._quantities[:start]
+        del self._prices[:start]
+        del self._indicators[:start]
+        self._start = 0
   
 class Trade:
     """
     Trade class to represent individual trades.
     """
+    __slots__ = ('timestamp', 'quantity', 'indicator', 'price')
+
     def __init__(self, timestamp, quantity, indicator, price):
         # Initialize a trade with given attributes
-        self.timestamp = timestamp # Time when trade occured
+        self.timestamp = timestamp # Time when trade occured, from time.monotonic_ns()
         self.quantity = quantity # Number of shares traded
         self.indicator = indicator # 'buy' or 'sell'
         self.price = price # Trade price per share
@@ -182,10 +530,11 @@ class UserInput:
     """
     User Input class for handling user interactions and inputs related to stock trading.
     """
-    def __init__(self):
-        # Initialize with predefined stock symbols and valid trading indicators
-        self.stockSymbols = ['TEA', 'POP', 'ALE', 'GIN', 'JOE']
-        self.validIndicators = ["buy", "sell"]
+    def __init__(self, stockSymbols=('TEA', 'POP', 'ALE', 'GIN', 'JOE')):
+        # Initialize with the available stock symbols (the sample stocks by default) and valid trading indicators
+        self.stockSymbols = frozenset(stockSymbols)
+        self._stockSymbolsDisplay = sorted(self.stockSymbols) # Sorted once for the prompt
+        self.validIndicators = _VALID_INDICATORS
 
     def get_stock_symbol(self):
         """
@@ -195,7 +544,7 @@ class UserInput:
             str or None: Selected stock symbol or None if user chooses to exit.
         """
         while True:
-            print("\nAvailable stock symbols:", stockSymbols)
+            print("\nAvailable stock symbols:", self._stockSymbolsDisplay)
             stockSymbol = input("Enter the stock symbol (or type 'exit' to quit): ").strip().upper()
             if stockSymbol == 'EXIT':
                 print("\nExiting the program. Goodbye!")
@@ -249,7 +598,6 @@ class UserInput:
     
 if __name__== "__main__":
 
-    userInput = UserInput()
     # Create a StockMarket instance
     stockMarket = StockMarket()
     
@@ -261,7 +609,8 @@ if __name__== "__main__":
     stockMarket.add_stock(Stock("GIN", "Preferred", 0.08, 0.02, 1))
     stockMarket.add_stock(Stock("JOE", "Common", 0.13, None, 2.5))
 
-    stockSymbols = list(stockMarket.stocks.keys())
+    # Let the user choose from the stocks in the market
+    userInput = UserInput(stockMarket.stocks)
     
     while True:
         stockSymbol = userInput.get_stock_symbol()
@@ -1,7 +1,8 @@
+import math
+import time
 import unittest
-from datetime import datetime, timedelta
 from unittest.mock import patch
-from super_simple_stock_market import Stock, Trade, StockMarket, UserInput
+from super_simple_stock_market import BUY, SELL, Stock, Trade, StockMarket, UserInput
 
 # Unit test for the Stock class
 class TestStock(unittest.TestCase):
@@ -24,6 +25,26 @@ class TestStock(unittest.TestCase):
         with self.assertRaises(ValueError):
             self.stockCommon.calculate_dividend_yield(0)
 
+    def test_calculate_dividend_yield_unknown_type(self):
+        # Test that an unknown stock type raises ValueError
+        stock = Stock("TEST", "Unknown", 8, None, 100)
+        with self.assertRaises(ValueError):
+            stock.calculate_dividend_yield(100)
+
+    def test_calculate_dividend_yield_updated_dividend(self):
+        # Test that the dividend yield uses the stock's current dividend
+        self.stockCommon.lastDividend = 4
+        self.assertEqual(self.stockCommon.calculate_dividend_yield(100), 0.04)
+        self.stockPreferred.fixedDividend = 0.04
+        self.assertEqual(self.stockPreferred.calculate_dividend_yield(100), 0.04)
+
+    def test_preferred_stock_without_fixed_dividend(self):
+        # Test that a Preferred stock can be created without a fixed dividend, failing only on the dividend yield
+        stock = Stock("TEST", "Preferred", 8, None, 100)
+        self.assertEqual(stock.calculate_pe_ratio(100), 12.5)
+        with self.assertRaises(TypeError):
+            stock.calculate_dividend_yield(100)
+
     def test_calculate_pe_ratio(self):
         # Test P/E ratio calculation
         self.assertEqual(self.stockCommon.calculate_pe_ratio(100), 12.5)
@@ -42,19 +63,113 @@ class TestStock(unittest.TestCase):
         self.assertEqual(trade.indicator, "buy")
         self.assertEqual(trade.price, 120)
 
+    def test_record_trade_indicator_code(self):
+        # Test recording trades with indicator codes
+        self.stockCommon.record_trade(100, BUY, 120)
+        self.stockCommon.record_trade(100, SELL, 130)
+        self.assertEqual([trade.indicator for trade in self.stockCommon.trades], ["buy", "sell"])
+
+    def test_record_trade_invalid_indicator(self):
+        # Test that recording a trade with an invalid indicator raises ValueError
+        with self.assertRaises(ValueError):
+            self.stockCommon.record_trade(100, "hold", 120)
+        self.assertEqual(self.stockCommon.count_trades(), 0)
+
+    def test_record_trade_invalid_price(self):
+        # Test that a trade with an invalid price records nothing, leaving later trades intact
+        with self.assertRaises(TypeError):
+            self.stockCommon.record_trade(100, "buy", None)
+        self.assertEqual(self.stockCommon.count_trades(), 0)
+        self.stockCommon.record_trade(200, "sell", 150)
+        trade = self.stockCommon.trades[0]
+        self.assertEqual((trade.quantity, trade.indicator, trade.price), (200, "sell", 150))
+        self.assertEqual(len(set(map(len, (self.stockCommon._timestamps, self.stockCommon._quantities,
+                                            self.stockCommon._prices, self.stockCommon._indicators)))), 1)
+
+    def test_record_trades(self):
+        # Test recording a batch of trades
+        self.stockCommon.record_trades([100, 200], ["buy", SELL], [120, 150])
+        self.assertEqual(self.stockCommon.count_trades(), 2)
+        trade = self.stockCommon.trades[1]
+        self.assertEqual(trade.quantity, 200)
+        self.assertEqual(trade.indicator, "sell")
+        self.assertEqual(trade.price, 150)
+        self.assertAlmostEqual(self.stockCommon.calculate_volume_weighted_stock_price(), 140)
+
+    def test_record_trades_invalid_indicator(self):
+        # Test that a batch of trades with an invalid indicator raises ValueError and records nothing
+        with self.assertRaises(ValueError):
+            self.stockCommon.record_trades([100, 200, 300], ["buy", "hold", "sell"], [120, 150, 130])
+        self.assertEqual(self.stockCommon.count_trades(), 0)
+
+    def test_record_trades_overflow(self):
+        # Test that a batch of huge trades is recorded the same way as the trades one at a time
+        self.stockCommon.record_trades([1e308, 1e308], ["buy", "buy"], [2, 2])
+        self.stockPreferred.record_trade(1e308, "buy", 2)
+        self.stockPreferred.record_trade(1e308, "buy", 2)
+        self.assertEqual(self.stockCommon.count_trades(), 2)
+        self.assertTrue(math.isnan(self.stockCommon.calculate_volume_weighted_stock_price()))
+        self.assertTrue(math.isnan(self.stockPreferred.calculate_volume_weighted_stock_price()))
+
+    def test_record_trades_mismatched_lengths(self):
+        # Test that a batch of trades with mismatched lengths raises ValueError and records nothing
+        with self.assertRaises(ValueError):
+            self.stockCommon.record_trades([100, 200], ["buy"], [120, 150])
+        self.assertEqual(self.stockCommon.count_trades(), 0)
+
     def test_calculate_volume_weighted_stock_price(self):
         # Test volume weighted stock price calculation
         self.stockCommon.record_trade(100, "buy", 120)
         self.stockCommon.record_trade(200, "buy", 150)
         self.assertAlmostEqual(self.stockCommon.calculate_volume_weighted_stock_price(), 140)
 
+    def test_calculate_volume_weighted_stock_price_expired_trades(self):
+        # Test that trades older than 5 minutes are excluded from the VWSP
+        now = time.monotonic_ns()
+        with patch('time.monotonic_ns', return_value=now - 360_000_000_000):
+            self.stockCommon.record_trade(100, "buy", 120)
+        self.stockCommon.record_trade(200, "buy", 150)
+        self.assertAlmostEqual(self.stockCommon.calculate_volume_weighted_stock_price(), 150)
+        self.assertEqual(self.stockCommon.count_trades(), 1)
+
+    def test_trades_excludes_expired_trades(self):
+        # Test that trades older than 5 minutes are left out of the trades without calculating the VWSP first
+        now = time.monotonic_ns()
+        with patch('time.monotonic_ns', return_value=now - 360_000_000_000):
+            self.stockCommon.record_trade(100, "buy", 120)
+        self.stockCommon.record_trade(200, "sell", 150)
+        self.assertEqual(self.stockCommon.count_trades(), 1)
+        self.assertEqual([trade.quantity for trade in self.stockCommon.trades], [200])
+
+    def test_calculate_volume_weighted_stock_price_large_expired_trade(self):
+        # Test that an expired trade much larger than the rest doesn't swamp the VWSP of the remaining trades
+        now = time.monotonic_ns()
+        with patch('time.monotonic_ns', return_value=now - 360_000_000_000):
+            self.stockCommon.record_trade(100, "buy", 1e200)
+        self.stockCommon.record_trade(100, "buy", 120)
+        self.assertAlmostEqual(self.stockCommon.calculate_volume_weighted_stock_price(), 120)
+
+        stock = Stock("TEST", "Common", 8, None, 100)
+        with patch('time.monotonic_ns', return_value=now - 360_000_000_000):
+            stock.record_trade(1e9, "buy", 1000.0)
+        stock.record_trade(0.1, "buy", 1.23456789)
+        self.assertAlmostEqual(stock.calculate_volume_weighted_stock_price(), 1.23456789, places=12)
+
+    def test_calculate_volume_weighted_stock_price_after_trades_expire(self):
+        # Test that the VWSP drops to 0 once all trades are more than 5 minutes old
+        self.stockCommon.record_trade(100, "buy", 120)
+        self.assertAlmostEqual(self.stockCommon.calculate_volume_weighted_stock_price(), 120)
+        with patch('time.monotonic_ns', return_value=time.monotonic_ns() + 360_000_000_000):
+            self.assertEqual(self.stockCommon.calculate_volume_weighted_stock_price(), 0)
+        self.assertEqual(self.stockCommon.count_trades(), 0)
+
 
 # Unit test for the Trade class
 class TestTrade(unittest.TestCase):
 
     def test_trade_initialization(self):
         # Test initialization of a Trade object
-        now = datetime.now()
+        now = time.monotonic_ns()
         trade = Trade(now, 100, "buy", 120)
         self.assertEqual(trade.timestamp, now)
         self.assertEqual(trade.quantity, 100)
@@ -78,11 +193,50 @@ class TestStockMarket(unittest.TestCase):
         self.assertIn("POP", self.stockMarket.stocks)
         self.assertIn("GIN", self.stockMarket.stocks)
 
+    def test_stocks_read_only(self):
+        # Test that stocks can't be added or removed without going through add_stock
+        with self.assertRaises(TypeError):
+            self.stockMarket.stocks["TEA"] = Stock("TEA", "Common", 0, None, 100)
+        with self.assertRaises(TypeError):
+            del self.stockMarket.stocks["POP"]
+
+    def test_add_stock_to_second_market(self):
+        # Test that a stock can't be added to more than one market
+        with self.assertRaises(ValueError):
+            StockMarket().add_stock(self.stockCommon)
+
+    def test_add_stock_replaces_symbol(self):
+        # Test that replacing a stock drops the old stock from the GBCE All Share Index
+        self.stockCommon.record_trade(100, "buy", 120)
+        self.stockPreferred.record_trade(200, "sell", 90)
+        self.stockMarket.add_stock(Stock("POP", "Common", 8, None, 100))
+        self.assertAlmostEqual(self.stockMarket.calculate_all_share_index(), 90)
+        self.stockCommon.record_trade(100, "buy", 1000)
+        self.assertAlmostEqual(self.stockMarket.calculate_all_share_index(), 90)
+
     def test_record_trade(self):
         # Test recording a trade for a stock
         self.stockMarket.record_trade("POP", 100, "buy", 120)
         self.assertEqual(len(self.stockMarket.stocks["POP"].trades), 1)
 
+    def test_record_trades(self):
+        # Test recording a batch of trades for a stock
+        self.stockMarket.record_trades("POP", [100, 200], ["buy", "sell"], [120, 150])
+        self.assertEqual(self.stockMarket.stocks["POP"].count_trades(), 2)
+
+    def test_record_trades_invalid_indicator(self):
+        # Test that a batch of trades with an invalid indicator raises ValueError and records nothing
+        with self.assertRaises(ValueError):
+            self.stockMarket.record_trades("POP", [100, 200, 300], ["buy", "hold", "sell"], [120, 150, 130])
+        self.assertEqual(self.stockMarket.stocks["POP"].count_trades(), 0)
+
+    def test_record_trades_invalid_indicator_and_symbol(self):
+        # Test that an invalid indicator is reported before an invalid symbol, as for a single trade
+        with self.assertRaisesRegex(ValueError, "Indicator"):
+            self.stockMarket.record_trade("INVALID", 100, "hold", 120)
+        with self.assertRaisesRegex(ValueError, "Indicator"):
+            self.stockMarket.record_trades("INVALID", [100], ["hold"], [120])
+
     def test_record_trade_invalid_symbol(self):
         # Test that recording a trade with an invalid symbol raises ValueError
         with self.assertRaises(ValueError):
@@ -92,6 +246,12 @@ class TestStockMarket(unittest.TestCase):
         # Test that recording a trade with an invalid symbol raises ValueError
         with self.assertRaises(ValueError):
             self.stockMarket.record_trade("POP", 100, "INVALID", 120)
+        self.assertEqual(self.stockMarket.stocks["POP"].count_trades(), 0)
+
+    def test_record_trade_indicator_code(self):
+        # Test recording a trade for a stock with an upper case indicator
+        self.stockMarket.record_trade("POP", 100, "SELL", 120)
+        self.assertEqual(self.stockMarket.stocks["POP"].trades[0].indicator, "sell")
 
     def test_calculate_all_share_index(self):
         # Test calculation of the GBCE All Share Index
@@ -99,6 +259,28 @@ class TestStockMarket(unittest.TestCase):
         self.stockPreferred.record_trade(200, "sell", 90)
         self.assertAlmostEqual(self.stockMarket.calculate_all_share_index(), 103.92304845413264, places=5)
 
+    def test_calculate_all_share_index_large_prices(self):
+        # Test that the GBCE All Share Index doesn't overflow for large prices
+        self.stockCommon.record_trade(100, "buy", 1e200)
+        self.stockPreferred.record_trade(200, "sell", 1e200)
+        self.assertAlmostEqual(self.stockMarket.calculate_all_share_index() / 1e200, 1)
+
+    def test_calculate_all_share_index_expired_trades(self):
+        # Test that stocks whose trades have all expired drop out of the GBCE All Share Index
+        now = time.monotonic_ns()
+        with patch('time.monotonic_ns', return_value=now - 360_000_000_000):
+            self.stockCommon.record_trade(100, "buy", 120)
+        self.stockPreferred.record_trade(200, "sell", 90)
+        self.assertAlmostEqual(self.stockMarket.calculate_all_share_index(), 90)
+
+    def test_calculate_all_share_index_after_trades_expire(self):
+        # Test that the GBCE All Share Index drops to 0 once all trades are more than 5 minutes old
+        self.stockCommon.record_trade(100, "buy", 120)
+        self.stockPreferred.record_trade(200, "sell", 90)
+        self.assertAlmostEqual(self.stockMarket.calculate_all_share_index(), 103.92304845413264, places=5)
+        with patch('time.monotonic_ns', return_value=time.monotonic_ns() + 360_000_000_000):
+            self.assertEqual(self.stockMarket.calculate_all_share_index(), 0)
+
     def test_calculate_all_share_index_no_trades(self):
         # Test GBCE All Share Index calculation when there are no trades
         self.assertEqual(self.stockMarket.calculate_all_share_index(), 0)
@@ -120,6 +302,15 @@ class TestUserInput(unittest.TestCase):
             symbol = self.ui.get_stock_symbol()
             self.assertEqual(symbol, 'ALE')
 
+    def test_stock_symbols_from_market(self):
+        # Test that the available stock symbols can be taken from a market
+        stockMarket = StockMarket()
+        stockMarket.add_stock(Stock("POP", "Common", 8, None, 100))
+        ui = UserInput(stockMarket.stocks)
+        with patch('builtins.input', side_effect=['TEA', 'pop']):
+            symbol = ui.get_stock_symbol()
+            self.assertEqual(symbol, 'POP')
+
     def test_exit_command(self):
         # Test exit command
         with patch('builtins.input', side_effect=['EXIT']):